@@ -0,0 +1,31 @@
+# cython: language_level=3
+"""
+C extension computing haversine distances between arrays of points
+"""
+cimport cython
+from libc.math cimport sin, atan2, sqrt, fmin, fmax
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def haversine_array(const double[::1] rad_lats1, const double[::1] rad_lngs1, const double[::1] cos_lats1,
+                    const double[::1] rad_lats2, const double[::1] rad_lngs2, const double[::1] cos_lats2,
+                    double[::1] out):
+    """
+    Writes distance (in meters) between i-th points of both arrays to out[i].
+    Points are given in radians along with precomputed cosines of their latitudes.
+    GIL is released during computation, so calls may run in parallel threads
+    """
+    cdef double r = 6371e3
+    cdef double a
+    cdef Py_ssize_t i, n = out.shape[0]
+    if not (rad_lats1.shape[0] == rad_lngs1.shape[0] == cos_lats1.shape[0] ==
+            rad_lats2.shape[0] == rad_lngs2.shape[0] == cos_lats2.shape[0] == n):
+        raise ValueError("all arrays must have the same length")
+    with nogil:
+        for i in range(n):
+            a = sin((rad_lats2[i] - rad_lats1[i]) / 2) ** 2 + \
+                cos_lats1[i] * cos_lats2[i] * sin((rad_lngs2[i] - rad_lngs1[i]) / 2) ** 2
+            a = fmin(fmax(a, 0), 1)
+            out[i] = r * 2 * atan2(sqrt(a), sqrt(1 - a))
@@ -2,50 +2,85 @@
 Module for displaying the nearest 10 filming locations on the interactive map
 """
 import json
-import os.path
-import six
-import sys
+import mmap
+import os
+import re
+import sqlite3
+import time
 import argparse
+from html import escape
 from math import sin, cos, pi, sqrt, atan2
-from typing import List, Tuple, Optional, Dict
+from dataclasses import dataclass
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+from typing import List, Tuple, Optional, Dict, Iterable, Callable
+import numpy as np
+from scipy.spatial import cKDTree
+from tqdm import tqdm
+import numexpr as ne
 from geopy.geocoders import Nominatim
 from geopy.extra.rate_limiter import RateLimiter
 from folium import Map, FeatureGroup, Marker, Icon, LayerControl
+from folium.plugins import FastMarkerCluster
 import folium.vector_layers
 
-sys.modules['sklearn.externals.six'] = six
-import mlrose as mlrose
+try:
+    from haversine_ext import haversine_array
+except ImportError:
+    haversine_array = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    prange = range
+
+    def njit(*args, **kwargs):
+        """
+        Replaces numba.njit when Numba is not installed, functions are left as plain Python
+        """
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+
+NUMEXPR_THREADS_VARIABLES = ('NUMEXPR_NUM_THREADS', 'NUMEXPR_MAX_THREADS', 'OMP_NUM_THREADS')
+ANNOTATIONS_RE = re.compile(r'\s*(?:\{.*\}|\(TV\)|\(V\))')
+YEAR_RE = re.compile(r'\((\d{4})[/IVX]*\)$')
+LOCATIONS_HEADER = b'LOCATIONS LIST\n'
 
 
 def read_dataset(path: str, year: int) -> List[Tuple[str, str]]:
     """
     Returns dataset as list of tuples (film name, filming location)
-    For example:
+    File is memory-mapped and read line by line, so only matching entries are kept in memory
     """
-    with open(path, 'r', encoding='ISO-8859-1') as file:
+    year_str = str(year)
+    year_bytes = year_str.encode()
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
         dataset = []
-        lines = file.read().split('\n')
-        for line in lines[lines.index("LOCATIONS LIST") + 2:-2]:
-            last_tab_index = line.rindex('\t')
-            if line[last_tab_index + 1] == '(':
-                line = line[:last_tab_index]
-            location = line[line.rindex('\t') + 1:]
-            line = line[:line.rindex('\t')]
-
-            if '}' in line:
-                line = line[:line.index('{') - 1]
-            if '\t' in line:
-                line = line[:line.index('\t')]
-            if '(TV)' in line:
-                line = line[:line.rindex('(TV)')]
-            if '(V)' in line:
-                line = line[:line.rindex('(V)')]
-            line = line.strip()
-
-            name = line
-            film_year = line[line.rindex(' '):][2:-1]
-            if film_year.isdigit() and int(film_year) == year:
-                dataset.append((name, location))
+        if mapped_file[:len(LOCATIONS_HEADER)] == LOCATIONS_HEADER:
+            mapped_file.seek(0)
+        elif (header_start := mapped_file.find(b'\n' + LOCATIONS_HEADER)) != -1:
+            mapped_file.seek(header_start + 1)
+        else:
+            raise ValueError("LOCATIONS LIST header not found")
+        mapped_file.readline()
+        mapped_file.readline()
+        for raw_line in iter(mapped_file.readline, b''):
+            if raw_line.startswith(b'----'):
+                break
+            if year_bytes not in raw_line:
+                continue
+            line = raw_line.decode('ISO-8859-1')
+            name = ANNOTATIONS_RE.sub('', line.partition('\t')[0]).strip()
+            if (match := YEAR_RE.search(name)) is None or match.group(1) != year_str:
+                continue
+
+            line, _, location = line.rstrip('\n').rpartition('\t')
+            if location.startswith('('):
+                line, _, location = line.rpartition('\t')
+            dataset.append((name, location))
         return dataset
 
 
@@ -59,110 +94,442 @@ def get_coordinates(location: str, geocode) -> Optional[Tuple[float, float]]:
     return location.latitude, location.longitude
 
 
-def load_geocache() -> Dict[str, Tuple[float, float]]:
+GEOCACHE_PATH = "geocache.sqlite3"
+LEGACY_GEOCACHE_PATH = "geocache"
+GEOCACHE_EXPIRE = 30 * 24 * 60 * 60
+GEOCACHE_QUERY_CHUNK = 500
+GEOCODING_WORKERS = 5
+
+
+def import_legacy_geocache(cache: sqlite3.Connection):
     """
-    Loads geocache from file
+    Imports entries of JSON geocache used by previous versions, if it exists.
+    Its modification time is used as fetch time of all entries, so they expire as usual
     """
-    if os.path.exists("geocache"):
-        with open('geocache', 'r', encoding='utf-8') as file:
-            return {k: None if v is None else tuple(v) for k, v in json.loads(file.read()).items()}
-    else:
-        return {}
+    if not os.path.exists(LEGACY_GEOCACHE_PATH):
+        return
+    fetched_at = os.path.getmtime(LEGACY_GEOCACHE_PATH)
+    with open(LEGACY_GEOCACHE_PATH, 'r', encoding='utf-8') as file:
+        legacy_cache = json.loads(file.read())
+    with cache:
+        cache.executemany("INSERT OR IGNORE INTO geocache VALUES (?, ?, ?, ?)",
+                          ((location, *((None, None) if coordinates is None else coordinates), fetched_at)
+                           for location, coordinates in legacy_cache.items()))
+
+
+def open_geocache() -> sqlite3.Connection:
+    """
+    Opens geocache database, creating it and importing legacy JSON geocache if needed
+    """
+    cache = sqlite3.connect(GEOCACHE_PATH)
+    if cache.execute("PRAGMA user_version").fetchone()[0] == 0:
+        cache.execute("CREATE TABLE IF NOT EXISTS geocache"
+                      "(location TEXT PRIMARY KEY, lat REAL, lng REAL, fetched_at REAL NOT NULL)")
+        import_legacy_geocache(cache)
+        with cache:
+            cache.execute("PRAGMA user_version = 1")
+    return cache
+
+
+def load_geocache(cache: sqlite3.Connection, locations: Iterable[str]) -> \
+        Dict[str, Optional[Tuple[float, float]]]:
+    """
+    Returns cached coordinates of given locations, which are not older than GEOCACHE_EXPIRE seconds.
+    Locations are queried in chunks of GEOCACHE_QUERY_CHUNK
+    """
+    fetched_after = time.time() - GEOCACHE_EXPIRE
+    locations = list(locations)
+    result = {}
+    for start in range(0, len(locations), GEOCACHE_QUERY_CHUNK):
+        chunk = locations[start:start + GEOCACHE_QUERY_CHUNK]
+        rows = cache.execute(f"SELECT location, lat, lng FROM geocache "
+                             f"WHERE fetched_at > ? AND location IN ({', '.join('?' * len(chunk))})",
+                             (fetched_after, *chunk))
+        for location, lat, lng in rows:
+            result[location] = None if lat is None else (lat, lng)
+    return result
+
+
+def save_geocache(cache: sqlite3.Connection, location: str, coordinates: Optional[Tuple[float, float]]):
+    """
+    Saves coordinates of location to geocache
+    """
+    lat, lng = (None, None) if coordinates is None else coordinates
+    with cache:
+        cache.execute("INSERT OR REPLACE INTO geocache VALUES (?, ?, ?, ?)", (location, lat, lng, time.time()))
 
 
-def save_geocache(cache: Dict[str, Tuple[float, float]]):
+@dataclass
+class FilmSet:
     """
-    Saves geocache to file
+    Films with coordinates of their filming locations stored as parallel arrays.
+    Coordinates are kept as geocoded, since they are written to the map. Radians and cosines
+    used by nearest locations search are float32, whose resolution (~1 m) is enough for it
     """
-    with open('geocache', 'w', encoding='utf-8') as file:
-        file.write(json.dumps(cache))
+    names: List[str]
+    lats: np.ndarray
+    lngs: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.names)
 
+    @cached_property
+    def rad_lats(self) -> np.ndarray:
+        return np.deg2rad(self.lats, dtype=np.float32)
 
-def create_progress(progress_name: str, total: int) -> Tuple[str, int, int]:
-    return progress_name, 0, total
+    @cached_property
+    def rad_lngs(self) -> np.ndarray:
+        return np.deg2rad(self.lngs, dtype=np.float32)
 
+    @cached_property
+    def cos_lats(self) -> np.ndarray:
+        return np.cos(self.rad_lats)
 
-def display_progress(progress: Tuple[str, int, int]):
-    sys.stdout.write(f"\r{progress[0]}: {progress[1] / progress[2] * 100:.2f}% ({progress[1]} out of {progress[2]})")
-    sys.stdout.flush()
+    def take(self, indices: np.ndarray) -> 'FilmSet':
+        """
+        Returns films at given indices
+        """
+        return FilmSet([self.names[i] for i in indices], self.lats[indices], self.lngs[indices])
 
 
-def get_films_with_coordinates(dataset: List[Tuple[str, str]]) -> \
-        List[Tuple[str, Tuple[float, float]]]:
+def get_films_with_coordinates(dataset: List[Tuple[str, str]]) -> FilmSet:
     """
-    Returns films with coordinates from films with location strings
+    Returns films with coordinates from films with location strings.
+    Geocoded locations are cached on disk for GEOCACHE_EXPIRE seconds
     """
     geolocator = Nominatim(user_agent="UCU_Lab_Geofilm")
-    geocode = RateLimiter(geolocator.geocode)
+    geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1)
+
+    with closing(open_geocache()) as cache:
+        distinct_locations = {entry[1] for entry in dataset}
+        locations = load_geocache(cache, distinct_locations)
+        missing = [location for location in distinct_locations if location not in locations]
+
+        executor = ThreadPoolExecutor(max_workers=GEOCODING_WORKERS)
+        futures = {}
+        try:
+            for location in missing:
+                futures[executor.submit(get_coordinates, location, geocode)] = location
+            for future in tqdm(as_completed(futures), desc="Fetching locations", total=len(futures)):
+                location, coordinates = futures[future], future.result()
+                locations[location] = coordinates
+                save_geocache(cache, location, coordinates)
+        finally:
+            # On interruption or error, queued requests are cancelled instead of being run
+            # at the rate limit just to be thrown away
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    names, lats, lngs = [], [], []
+    for name, location in dataset:
+        if (coordinates := locations[location]) is not None:
+            names.append(name)
+            lats.append(coordinates[0])
+            lngs.append(coordinates[1])
+    return FilmSet(names, np.array(lats), np.array(lngs))
+
+
+def make_haversine_from(lat0: float, lng0: float) -> Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray]:
+    """
+    Returns function, which computes distances (in meters) from (lat0, lng0) to points
+    given in radians along with cosines of their latitudes.
+    Values depending only on (lat0, lng0) are computed once
+    >>> rad_lats, rad_lngs = np.deg2rad([54.0]), np.deg2rad([21.0])
+    >>> make_haversine_from(53, 19)(rad_lats, rad_lngs, np.cos(rad_lats))
+    array([172797.45147392])
+    """
+    r = 6371e3
+    rad_lat0 = lat0 * pi / 180
+    rad_lng0 = lng0 * pi / 180
+    cos_lat0 = cos(rad_lat0)
 
-    filming_locations = []
-    cache = load_geocache()
-    progress = create_progress("Fetching locations", len(dataset))
-    for entry in dataset:
-        if entry[1] not in cache:
-            cache[entry[1]] = get_coordinates(entry[1], geocode)
-        if (coordinates := cache[entry[1]]) is not None:
-            filming_locations.append((entry[0], coordinates))
-        progress = (progress[0], progress[1] + 1, progress[2])
-        display_progress(progress)
+    def haversine(rad_lats: np.ndarray, rad_lngs: np.ndarray, cos_lats: np.ndarray) -> np.ndarray:
+        a = np.sin((rad_lats - rad_lat0) / 2) ** 2 + cos_lat0 * cos_lats * np.sin((rad_lngs - rad_lng0) / 2) ** 2
+        # rounding may push a slightly out of [0, 1] for (near-)antipodal points
+        a = np.clip(a, 0, 1)
+        return r * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
-    save_geocache(cache)
-    return filming_locations
+    return haversine
 
 
-def distance(point1: Tuple[float, float], point2: Tuple[float, float]) -> float:
+def get_smallest_indices(values: np.ndarray, count: int) -> np.ndarray:
     """
-    Computes distance between two points
-    >>> distance((54, 21), (53, 19))
-    172797.4514739205
-    >>> distance((54, 21), (-41, 174))
-    172797.4514739205
+    Returns indices of count smallest values in ascending order of value.
+    Uses partial selection, so only the selected values are sorted
+    >>> get_smallest_indices(np.array([5.0, 1.0, 4.0, 2.0, 3.0]), 3)
+    array([1, 3, 4])
     """
-    r = 6371e3
-    phi1 = point1[0] * pi / 180
-    phi2 = point2[0] * pi / 180
-    delta_phi = (point2[0] - point1[0]) * pi / 180
-    delta_lambda = (point2[1] - point1[1]) * pi / 180
-    a = sin(delta_phi / 2) * sin(delta_phi / 2) + cos(phi1) * cos(phi2) * sin(delta_lambda / 2) * sin(delta_lambda / 2)
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return r * c
+    if count < len(values):
+        indices = np.argpartition(values, count)[:count]
+    else:
+        indices = np.arange(len(values))
+    return indices[np.argsort(values[indices])]
+
+
+def to_unit_vectors(rad_lats: np.ndarray, rad_lngs: np.ndarray, cos_lats: np.ndarray) -> np.ndarray:
+    """
+    Converts coordinates (in radians) to points on the unit sphere. Euclidean (chord)
+    distance between such points grows monotonically with the great-circle distance
+    >>> to_unit_vectors(np.array([0.0, pi / 2]), np.array([0.0, 0.0]), np.array([1.0, 0.0])).round(6)
+    array([[1., 0., 0.],
+           [0., 0., 1.]])
+    """
+    return np.column_stack((cos_lats * np.cos(rad_lngs), cos_lats * np.sin(rad_lngs), np.sin(rad_lats)))
+
+
+def build_location_index(films: FilmSet) -> cKDTree:
+    """
+    Builds spatial index over filming locations for nearest locations queries
+    """
+    return cKDTree(to_unit_vectors(films.rad_lats, films.rad_lngs, films.cos_lats))
+
+
+def get_nearest_locations(films: FilmSet, location: Tuple[float, float], count: int = 10,
+                          index: Optional[cKDTree] = None) -> FilmSet:
+    """
+    Returns top count (10 by default) nearest locations.
+    Index built by build_location_index should be passed when querying the same films repeatedly,
+    otherwise single linear scan is done, which is cheaper than building the index
+    """
+    if len(films) == 0:
+        return films
+    if index is None:
+        distances = make_haversine_from(*location)(films.rad_lats, films.rad_lngs, films.cos_lats)
+        return films.take(get_smallest_indices(distances, count))
+    rad_lat, rad_lng = np.deg2rad(location)
+    point = to_unit_vectors(rad_lat, rad_lng, np.cos(rad_lat))[0]
+    _, indices = index.query(point, k=min(count, len(films)))
+    return films.take(np.atleast_1d(indices))
+
+
+PARALLEL_MIN_PAIRS = 100_000
 
 
-def get_nearest_locations(dataset: List[Tuple[str, Tuple[float, float]]],
-                          location: Tuple[float, float]) -> List[Tuple[str, Tuple[float, float]]]:
+def pairwise_haversine_ext(rad_lats: np.ndarray, rad_lngs: np.ndarray, cos_lats: np.ndarray) -> np.ndarray:
     """
-    Returns top 10 nearest locations
+    Computes pairwise distances matrix with haversine_ext C extension row by row straight into
+    the result matrix, spreading rows between threads for large inputs
     """
-    return sorted(dataset, key=lambda x: distance(x[1], location))[:10]
+    n = rad_lats.shape[0]
+    result = np.zeros((n, n))
+
+    def fill_rows(first_row: int, step: int):
+        for i in range(first_row, n - 1, step):
+            count = n - i - 1
+            haversine_array(np.full(count, rad_lats[i]), np.full(count, rad_lngs[i]), np.full(count, cos_lats[i]),
+                            rad_lats[i + 1:], rad_lngs[i + 1:], cos_lats[i + 1:], result[i, i + 1:])
+
+    workers = os.cpu_count() or 1
+    if n * (n - 1) // 2 < PARALLEL_MIN_PAIRS or workers == 1:
+        fill_rows(0, 1)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(fill_rows, worker, workers) for worker in range(workers)]:
+                future.result()
+    for i in range(n - 1):
+        result[i + 1:, i] = result[i, i + 1:]
+    return result
 
 
-def get_shortest_path(coordinates: List[Tuple[float, float]]) -> List[int]:
-    distances = []
-    for idx1, coord1 in enumerate(coordinates):
-        for idx2, coord2 in enumerate(coordinates):
-            if idx1 < idx2:
-                distances.append((idx1, idx2, distance(coord1, coord2)))
+def pairwise_haversine_numexpr(rad_lats: np.ndarray, rad_lngs: np.ndarray, cos_lats: np.ndarray) -> np.ndarray:
+    """
+    Computes pairwise distances matrix with numexpr, which evaluates expressions
+    in cache-sized blocks on all cores. All steps are done in place in a single result matrix
+    """
+    n = rad_lats.shape[0]
+    result = np.empty((n, n))
+    ne.evaluate("sin((lat_j - lat_i) / 2) ** 2 + cos_i * cos_j * sin((lng_j - lng_i) / 2) ** 2",
+                local_dict={'lat_i': rad_lats[:, None], 'lat_j': rad_lats[None, :],
+                            'lng_i': rad_lngs[:, None], 'lng_j': rad_lngs[None, :],
+                            'cos_i': cos_lats[:, None], 'cos_j': cos_lats[None, :]}, out=result)
+    np.clip(result, 0, 1, out=result)
+    return ne.evaluate("2 * 6371e3 * arctan2(sqrt(a), sqrt(1 - a))", local_dict={'a': result}, out=result)
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def pairwise_haversine_numba(rad_lats: np.ndarray, rad_lngs: np.ndarray, cos_lats: np.ndarray) -> np.ndarray:
+    """
+    Computes pairwise distances matrix with Numba-compiled loop, rows are spread between threads
+    """
+    r = 6371e3
+    n = rad_lats.shape[0]
+    result = np.zeros((n, n))
+    for i in prange(n):
+        for j in range(i + 1, n):
+            a = sin((rad_lats[j] - rad_lats[i]) / 2) ** 2 + \
+                cos_lats[i] * cos_lats[j] * sin((rad_lngs[j] - rad_lngs[i]) / 2) ** 2
+            a = min(max(a, 0.0), 1.0)
+            result[i, j] = result[j, i] = r * 2 * atan2(sqrt(a), sqrt(1 - a))
+    return result
+
+
+PAIRWISE_BACKENDS = {
+    'ext': pairwise_haversine_ext,
+    'numexpr': pairwise_haversine_numexpr,
+    'numba': pairwise_haversine_numba,
+}
+
+
+def pairwise_haversine(rad_lats: np.ndarray, rad_lngs: np.ndarray, cos_lats: np.ndarray,
+                       backend: Optional[str] = None) -> np.ndarray:
+    """
+    Returns matrix of distances (in meters) between every pair of points given in radians
+    along with precomputed cosines of their latitudes.
+    backend is one of PAIRWISE_BACKENDS, by default haversine_ext C extension is used if it is built
+    and numexpr otherwise. Inputs may be float32, they are converted to float64 once,
+    so the matrix is computed and stored in float64
+    """
+    if backend is None:
+        backend = 'numexpr' if haversine_array is None else 'ext'
+    if backend not in PAIRWISE_BACKENDS:
+        raise ValueError(f"unknown backend {backend}, expected one of {', '.join(PAIRWISE_BACKENDS)}")
+    if backend == 'ext' and haversine_array is None:
+        raise ValueError("haversine_ext is not built, run python setup.py build_ext --inplace")
+    rad_lats, rad_lngs, cos_lats = (np.ascontiguousarray(array, dtype=np.float64)
+                                    for array in (rad_lats, rad_lngs, cos_lats))
+    return PAIRWISE_BACKENDS[backend](rad_lats, rad_lngs, cos_lats)
+
+
+@njit(cache=True)
+def solve_tsp_exact(matrix: np.ndarray) -> np.ndarray:
+    """
+    Returns optimal tour starting at node 0 using Held-Karp dynamic programming.
+    Takes O(2^n * n^2) time, so is suitable only for small n
+    >>> matrix = np.array([[0, 3, 9, 4, 7], [3, 0, 2, 8, 6], [9, 2, 0, 5, 1], [4, 8, 5, 0, 2], [7, 6, 1, 2, 0]])
+    >>> solve_tsp_exact(matrix.astype(np.float64)).tolist()
+    [0, 3, 4, 2, 1]
+    >>> solve_tsp_exact(np.zeros((1, 1))).tolist()
+    [0]
+    """
+    n = matrix.shape[0]
+    subsets = 1 << (n - 1)
+    cost = np.full((subsets, max(n - 1, 1)), np.inf)
+    parent = np.full((subsets, max(n - 1, 1)), -1, dtype=np.int64)
+    for node in range(n - 1):
+        cost[1 << node, node] = matrix[0, node + 1]
+    for subset in range(1, subsets):
+        for last in range(n - 1):
+            if not (subset >> last) & 1 or cost[subset, last] == np.inf:
+                continue
+            for node in range(n - 1):
+                if (subset >> node) & 1:
+                    continue
+                extended = subset | (1 << node)
+                new_cost = cost[subset, last] + matrix[last + 1, node + 1]
+                if new_cost < cost[extended, node]:
+                    cost[extended, node] = new_cost
+                    parent[extended, node] = last
+
+    best_last, best_cost = -1, np.inf
+    for last in range(n - 1):
+        total = cost[subsets - 1, last] + matrix[last + 1, 0]
+        if total < best_cost:
+            best_last, best_cost = last, total
+    if n > 1 and best_last == -1:
+        raise ValueError("distance matrix must contain only finite values")
+
+    tour = np.zeros(n, dtype=np.int64)
+    subset, last = subsets - 1, best_last
+    for position in range(n - 1, 0, -1):
+        tour[position] = last + 1
+        previous = parent[subset, last]
+        subset ^= 1 << last
+        last = previous
+    return tour
+
+
+@njit(cache=True)
+def solve_tsp_heuristic(matrix: np.ndarray, start: int) -> np.ndarray:
+    """
+    Returns tour starting at node start built by nearest neighbour heuristic
+    and improved with 2-opt moves until no move shortens it
+    >>> matrix = np.array([[0, 3, 9, 4, 7], [3, 0, 2, 8, 6], [9, 2, 0, 5, 1], [4, 8, 5, 0, 2], [7, 6, 1, 2, 0]])
+    >>> solve_tsp_heuristic(matrix.astype(np.float64), 2).tolist()
+    [2, 4, 3, 0, 1]
+    >>> solve_tsp_heuristic(np.zeros((1, 1)), 0).tolist()
+    [0]
+    """
+    n = matrix.shape[0]
+    tour = np.full(n, start, dtype=np.int64)
+    visited = np.zeros(n, dtype=np.bool_)
+    visited[start] = True
+    for position in range(1, n):
+        current, nearest = tour[position - 1], -1
+        for node in range(n):
+            if not visited[node] and (nearest == -1 or matrix[current, node] < matrix[current, nearest]):
+                nearest = node
+        tour[position] = nearest
+        visited[nearest] = True
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                a, b = tour[i - 1], tour[i]
+                c, d = tour[j], tour[(j + 1) % n]
+                if matrix[a, c] + matrix[b, d] < matrix[a, b] + matrix[c, d] - 1e-9:
+                    tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+                    improved = True
+    return tour
+
+
+def get_tour_length(matrix: np.ndarray, tour: np.ndarray) -> float:
+    """
+    Returns length of closed tour using dense distance matrix
+    >>> get_tour_length(np.array([[0, 1, 2], [1, 0, 3], [2, 3, 0]]), np.array([0, 2, 1]))
+    6.0
+    """
+    return float(matrix[tour, np.roll(tour, -1)].sum())
+
+
+HELD_KARP_MAX_NODES = 13
+HEURISTIC_STARTS = 10
+
+
+def get_shortest_path(lats: np.ndarray, lngs: np.ndarray, backend: Optional[str] = None) -> List[int]:
+    """
+    Returns order in which points should be visited to travel the shortest closed path.
+    Path is exact for up to HELD_KARP_MAX_NODES points, otherwise it is the shortest
+    of 2-opt optimal tours started from HEURISTIC_STARTS different points.
+    Distances are computed with given pairwise_haversine backend
+    """
+    rad_lats, rad_lngs = np.deg2rad(lats), np.deg2rad(lngs)
+    matrix = pairwise_haversine(rad_lats, rad_lngs, np.cos(rad_lats), backend)
+    if len(lats) <= HELD_KARP_MAX_NODES:
+        return solve_tsp_exact(matrix).tolist()
+    tours = [solve_tsp_heuristic(matrix, start) for start in range(min(len(lats), HEURISTIC_STARTS))]
+    tour = min(tours, key=lambda x: get_tour_length(matrix, x))
+    return np.roll(tour, -np.flatnonzero(tour == 0)[0]).tolist()
 
-    fitness_dists = mlrose.TravellingSales(distances=distances)
-    problem_fit = mlrose.TSPOpt(length=len(coordinates), fitness_fn=fitness_dists, maximize=False)
-    return mlrose.genetic_alg(problem_fit, mutation_prob=0.2, max_attempts=50, random_state=2)[0]
 
+MARKER_CALLBACK = """
+    function (row) {
+        var marker = L.marker(new L.LatLng(row[0], row[1]));
+        marker.setIcon(L.AwesomeMarkers.icon({icon: 'info-sign', markerColor: 'blue', prefix: 'glyphicon'}));
+        marker.bindPopup(row[2]);
+        return marker;
+    }"""
 
-def get_map(dataset: List[Tuple[str, Tuple[float, float]]], location: Tuple[float, float]) -> Map:
+
+def get_map(films: FilmSet, location: Tuple[float, float], backend: Optional[str] = None) -> Map:
     """
-    Returns map with given list of points in dataset
+    Returns map with filming locations of given films
     """
     html_map = Map(location=location, zoom_start=5)
 
     points_fg = FeatureGroup(name="Filming locations")
-    for entry in dataset:
-        points_fg.add_child(Marker(location=entry[1], popup=entry[0], icon=Icon()))
+    points_fg.add_child(FastMarkerCluster(data=[[lat, lng, escape(name)] for name, lat, lng in
+                                                zip(films.names, films.lats.tolist(), films.lngs.tolist())],
+                                          callback=MARKER_CALLBACK, control=False))
     html_map.add_child(points_fg)
 
     lines_fg = FeatureGroup(name="Shortest Path")
 
-    all_coords = [location] + list(map(lambda x: x[1], dataset))
-    path = list(map(lambda x: all_coords[x], get_shortest_path(all_coords)))
+    lats = np.concatenate(([location[0]], films.lats))
+    lngs = np.concatenate(([location[1]], films.lngs))
+    path = [(lats[i], lngs[i]) for i in get_shortest_path(lats, lngs, backend)]
     lines_fg.add_child(folium.vector_layers.PolyLine(locations=path + [path[0]], weight=5))
     lines_fg.add_child(Marker(location=location, popup="You are here", icon=Icon(color='green')))
 
@@ -173,11 +540,22 @@ def get_map(dataset: List[Tuple[str, Tuple[float, float]]], location: Tuple[floa
     return html_map
 
 
+def create_maps(path_to_dataset: str, locations: List[Tuple[float, float]], year: int,
+                backend: Optional[str] = None):
+    """
+    Saves map for the first location to map.html and maps for the others to map_<n>.html.
+    Dataset is geocoded once and, for several locations, indexed once for all queries
+    """
+    films = get_films_with_coordinates(read_dataset(path_to_dataset, year))
+    index = build_location_index(films) if len(locations) > 1 and len(films) > 0 else None
+    for number, location in enumerate(locations):
+        nearest_locations = get_nearest_locations(films, location, index=index)
+        html_map = get_map(nearest_locations, location, backend)
+        html_map.save('map.html' if number == 0 else f'map_{number}.html')
+
+
 def create_map(path_to_dataset: str, location: Tuple[float, float], year: int):
-    dataset = get_films_with_coordinates(read_dataset(path_to_dataset, year))
-    nearest_locations = get_nearest_locations(dataset, location)
-    html_map = get_map(nearest_locations, location)
-    html_map.save('map.html')
+    create_maps(path_to_dataset, [location], year)
 
 
 def main():
@@ -190,8 +568,17 @@ def main():
                         type=float)
     parser.add_argument("path", help="database file path",
                         type=str)
+    parser.add_argument("--also", help="additional location, map for n-th one is saved to map_<n>.html",
+                        type=float, nargs=2, metavar=("LAT", "LNG"), action="append", default=[])
+    parser.add_argument("--backend", help="distance matrix backend (by default ext if it is built, numexpr otherwise)",
+                        type=str, choices=PAIRWISE_BACKENDS)
     args = parser.parse_args()
-    create_map(args.path, (args.lat, args.lng), args.year)
+    # numexpr default thread count depends on its version and environment,
+    # so use all cores unless thread count is configured by user
+    if not any(variable in os.environ for variable in NUMEXPR_THREADS_VARIABLES):
+        ne.set_num_threads(min(ne.detect_number_of_cores(), ne.MAX_THREADS))
+    create_maps(args.path, [(args.lat, args.lng)] + [tuple(location) for location in args.also], args.year,
+                args.backend)
 
 
 if __name__ == "__main__":
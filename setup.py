@@ -0,0 +1,11 @@
+"""
+Builds optional haversine C extension:
+python setup.py build_ext --inplace
+"""
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name="UCU_Lab_Geofilm",
+    ext_modules=cythonize("haversine_ext.pyx"),
+)
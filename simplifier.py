@@ -1,16 +1,69 @@
-from random import sample
+from itertools import islice
+from math import exp, floor, log
+from random import random, randrange
+from typing import Iterator, List
 import argparse
 
 
+def sample_lines(lines: Iterator[str], lines_count: int) -> List[str]:
+    """
+    Returns lines_count random lines using reservoir sampling (Algorithm L),
+    so lines are read in a single pass and only selected ones are kept in memory.
+    Lines are always read to the end
+    >>> import random
+    >>> random.seed(7)
+    >>> lines = iter(map(str, range(20)))
+    >>> sample_lines(lines, 5)
+    ['13', '15', '6', '3', '4']
+    >>> next(lines, None) is None
+    True
+    >>> lines = iter(map(str, range(20)))
+    >>> sample_lines(lines, 0), next(lines, None) is None
+    ([], True)
+    >>> sample_lines(iter(map(str, range(3))), 5)
+    ['0', '1', '2']
+    """
+    if lines_count == 0:
+        for _ in lines:
+            pass
+        return []
+    reservoir = list(islice(lines, lines_count))
+    if len(reservoir) < lines_count:
+        return reservoir
+
+    weight = exp(log(1 - random()) / lines_count)
+    while True:
+        skip = floor(log(1 - random()) / log(1 - weight))
+        line = next(islice(lines, skip, skip + 1), None)
+        if line is None:
+            return reservoir
+        reservoir[randrange(lines_count)] = line
+        weight *= exp(log(1 - random()) / lines_count)
+
+
 def simplify(src: str, dst: str, lines_count: int):
-    with open(src, 'r', encoding='iso-8859-1') as source_file:
-        lines = source_file.read().split('\n')
-        header_lines = lines[:lines.index("LOCATIONS LIST") + 2]
-        selected_lines = sample(lines, lines_count)
-        bottom_lines = lines[-2:]
-
-        with open(dst, 'w', encoding='iso-8859-1') as dest_file:
-            dest_file.write('\n'.join(header_lines + selected_lines + bottom_lines))
+    with open(src, 'r', encoding='iso-8859-1') as source_file, \
+            open(dst, 'w', encoding='iso-8859-1') as dest_file:
+        for line in source_file:
+            dest_file.write(line)
+            if line.rstrip('\n') == "LOCATIONS LIST":
+                dest_file.write(next(source_file, ''))
+                break
+
+        bottom_lines = []
+
+        def location_lines() -> Iterator[str]:
+            for location_line in source_file:
+                if location_line.startswith('----'):
+                    bottom_lines.append(location_line)
+                    bottom_lines.extend(source_file)
+                    return
+                yield location_line
+
+        for line in sample_lines(location_lines(), lines_count):
+            dest_file.write(line)
+        for line in bottom_lines:
+            dest_file.write(line)
 
 
 def main():